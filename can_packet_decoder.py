@@ -140,10 +140,10 @@ import os.path
 import argparse
 import re
 import json
+import mmap
 from types import SimpleNamespace
-from collections import deque
 
-re_parsing_can_msg = r'^ *([^;]*) *; *([0-9aAbBcCdDeEfF]{3}) *; *([0-9]{1,}) *; *([0-9]+) *; *([0-9aAbBcCdDeEfF]+) *$'
+RE_CAN_MSG = re.compile(rb'^ *([^;\n]*) *; *([0-9aAbBcCdDeEfF]{3}) *; *([0-9]{1,}) *; *([0-9]+) *; *([0-9aAbBcCdDeEfF]+) *\r?$', re.ASCII | re.MULTILINE)
 
 # Please note:
 # for any date format use regex:
@@ -151,85 +151,140 @@ re_parsing_can_msg = r'^ *([^;]*) *; *([0-9aAbBcCdDeEfF]{3}) *; *([0-9]{1,}) *;
 # for specific date format like YYYY-MM-dd HH:mm:ss.xxx use something like:
 #     r'^ *([0-9]{4}-[0-9]{2}-[0-9]{2} [0-9]{2}:[0-9]{2}:[0-9]{2}\.[0-9]{3}) *;'
 
-# Store decoded packets
-packet_list = deque()
-
 class TerminalColors:
     BLUE = '\033[94m'
     CYAN = '\033[96m'
     GREEN = '\033[92m'
     END = '\033[0m'
 
+# Opcodes of the compiled decoding program (see compile_schema)
+OP_FIXED = 0
+OP_DYNAMIC = 1
+OP_BLOCK = 2
+
+def compile_schema(structure) -> list:
+    # Translate the JSON "decode" structure into a flat list of opcodes,
+    # so the schema is interpreted once and not for every message:
+    #     (OP_FIXED, ((name, start, end), ...), length)
+    #     (OP_DYNAMIC, name, len_bytes)
+    #     (OP_BLOCK, len_bytes, subprogram, name)
+    # Consecutive FIXED fields are merged into a single OP_FIXED, with
+    # offsets relative to the first field of the run.
+    prog = []
+    for elem in structure:
+        if elem["type"] == "FIXED":
+            if prog and prog[-1][0] is OP_FIXED:
+                _, fields, length = prog.pop()
+            else:
+                fields, length = (), 0
+            fields += ((elem["name"], length, length + elem["length"]),)
+            prog.append((OP_FIXED, fields, length + elem["length"]))
+        elif elem["type"] == "DYNAMIC":
+            prog.append((OP_DYNAMIC, elem["name"], elem["length"]))
+        elif elem["type"] == "BLOCK":
+            prog.append((OP_BLOCK, elem["length"], compile_schema(elem["subfields"]), elem["name"] + "_"))
+        else:
+            print("ERR: Invalid type (" + str(elem["type"]) + ") in JSON decoding. Stop decoding!")
+            break
+    return prog
+
 class CanMessage:
+
+    __slots__ = ('datetime', 'cob_id_hex', 'seq_num', 'len', 'data_hex', 'decode_prog', 'decoding_index', 'value')
     
-    def __decode_payload(self, structure, value_name_prefix: str):
+    def __decode_payload(self, prog, value_name_prefix: str, data_hex: str, value: list, index: int) -> int:
         # Please note: 
-        # this is a recursive function and the variable "structure" is 
-        # specific to current level of JSON hierarchy
-        for elem in structure:
-
-            if elem["type"] == "FIXED":
-                # store decoded value
-                start_char = 2 * self.decoding_index
-                end_char = start_char + 2 * elem["length"]
-                self.value[value_name_prefix + elem["name"]] = str(self.data_hex[start_char:end_char])
-                # move index to next field
-                self.decoding_index = self.decoding_index + elem["length"]
-
-            elif elem["type"] == "DYNAMIC":
+        # this is a recursive function (only for BLOCK) and the variable "prog" 
+        # is the compiled program specific to current level of JSON hierarchy.
+        # Values are stored as slices of "data_hex" to keep them as written
+        # in the input; "index" counts bytes (2 hex chars).
+        # Returns the byte index of the next field, or None when decoding stopped.
+        pc = 0
+        while pc < len(prog):
+            instr = prog[pc]
+            op = instr[0]
+
+            if op is OP_FIXED:
+                # store decoded values and move index to next field
+                for name, start, end in instr[1]:
+                    value.append((value_name_prefix + name, data_hex[2*(index+start):2*(index+end)]))
+                index += instr[2]
+
+            elif op is OP_DYNAMIC:
                 # get length of data
-                start_char = 2 * self.decoding_index
-                end_char = start_char + 2 * elem["length"]
-                tmp_len = int(self.data_hex[start_char:end_char], 16)
-                # move index to get data
-                self.decoding_index = self.decoding_index + elem["length"]
-                # store decoded value
-                start_char = 2 * self.decoding_index
-                end_char = start_char + 2 * tmp_len
-                self.value[value_name_prefix + elem["name"]] = str(self.data_hex[start_char:end_char])
-                # move index to next field
-                self.decoding_index = self.decoding_index + tmp_len
-
-            elif elem["type"] == "BLOCK":
-                # get the number of blocks
-                start_char = 2 * self.decoding_index
-                end_char = start_char + 2 * elem["length"]
-                tmp_nblocks = int(self.data_hex[start_char:end_char], 16)
-                # move index to get blocks
-                self.decoding_index = self.decoding_index + elem["length"]
-                for nb in range (0, tmp_nblocks):
-                    self.__decode_payload(elem["subfields"], elem["name"] + "_" + str(nb + 1) + "_")
-            else: 
-                print("ERR: Invalid type (" + str(elem["type"]) + ") in JSON decoding. Stop decoding!")
-                break;            
+                end = index + instr[2]
+                if end > len(data_hex) // 2:
+                    print("ERR: Truncated payload (" + value_name_prefix + instr[1] + ") in message decoding. Stop decoding!")
+                    return None
+                tmp_len = int(data_hex[2*index:2*end], 16)
+                # store decoded value and move index to next field
+                index = end + tmp_len
+                value.append((value_name_prefix + instr[1], data_hex[2*end:2*index]))
+
+            else:
+                # OP_BLOCK: get the number of blocks
+                end = index + instr[1]
+                if end > len(data_hex) // 2:
+                    print("ERR: Truncated payload (" + value_name_prefix + instr[3][:-1] + ") in message decoding. Stop decoding!")
+                    return None
+                tmp_nblocks = int(data_hex[2*index:2*end], 16)
+                index = end
+                # block fields are named after the innermost block only
+                block_prefix = instr[3]
+                subprog = instr[2]
+                if len(subprog) == 1 and subprog[0][0] is OP_FIXED:
+                    # block made only of FIXED fields: constant stride, no recursion
+                    fields = subprog[0][1]
+                    stride = subprog[0][2]
+                    for nb in range (0, tmp_nblocks):
+                        nb_prefix = block_prefix + str(nb + 1) + "_"
+                        for name, start, end in fields:
+                            value.append((nb_prefix + name, data_hex[2*(index+start):2*(index+end)]))
+                        index += stride
+                else:
+                    for nb in range (0, tmp_nblocks):
+                        index = self.__decode_payload(subprog, block_prefix + str(nb + 1) + "_", data_hex, value, index)
+                        if index is None:
+                            return None
+
+            pc += 1
+        return index
 
     def Decode(self):
-        # decode payload, byte after byte, based on JSON structure
-        self.__decode_payload(self.decoding_structure, "")
+        # decode payload, byte after byte, based on compiled JSON structure
+        index = self.__decode_payload(self.decode_prog, "", self.data_hex, self.value, self.decoding_index)
+        if index is not None:
+            self.decoding_index = index
 
     def Info(self):
-        info = f"Packet: {self.datetime} ({self.cob_id_hex}) {self.data_hex}"
-        info = info + "\nValues:\n"
-        for v in self.value:
-            info = info + f"{str(v):>25} - {str(self.value[v]):<}\n"
-        info = info + "\n\n"
-        return info
+        parts = [f"Packet: {self.datetime} ({self.cob_id_hex}) {self.data_hex}", "Values:"]
+        parts.extend(f"{name:>25} - {val:<}" for name, val in self.value)
+        parts.extend(("", "", ""))
+        return "\n".join(parts)
     
-    def __init__(self, datetime: str, cob_id_hex: str, seq_num: int, len: int, data_hex: str, decoding_structure):
-        self.datetime = str(decoded_values.group(1))
-        self.cob_id_hex = str(decoded_values.group(2))
-        self.seq_num = int(decoded_values.group(3))
-        self.len = int(decoded_values.group(4))
-        self.data_hex = str(decoded_values.group(5))
-        self.decoding_structure = decoding_structure
+    def __init__(self, datetime: str, cob_id_hex: str, seq_num: int, length: int, data_hex: str, decode_prog: list):
+        self.datetime = datetime
+        self.cob_id_hex = cob_id_hex
+        self.seq_num = seq_num
+        self.len = length
+        self.data_hex = data_hex
+        self.decode_prog = decode_prog
         self.decoding_index = 0 # byte index
-        self.value = dict()
-
-def write_decoded_packets():
-    output_file = open(arguments_list.datafilepath + ".dp", "w")
-    for elem in packet_list:
-        output_file.write(elem.Info() + "\n")
-    output_file.close() 
+        self.value = [] # (name, value) in decoding order
+
+def write_decoded_packet(info: str):
+    output_file.write(info)
+    output_file.write("\n")
+
+def scan_file(file, pattern):
+    # Memory-map the file and let the regex engine scan all lines in one pass
+    # (pattern is anchored per line with MULTILINE)
+    if os.fstat(file.fileno()).st_size == 0:
+        return
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        yield from pattern.finditer(mm)
 
 def create_arg_parser():
     # Creates and returns the ArgumentParser object
@@ -269,40 +324,48 @@ if __name__ == "__main__":
                 except json.decoder.JSONDecodeError as e:
                     print("ERR: invalid JSON : " + str(e))
 
+            # Translate JSON description once, for all messages
+            decode_prog = compile_schema(json_msg_decode["decode"])
+            cob_target = json_msg_decode["cob"].encode('ascii')
+            min_len = json_msg_decode["min_length"]
+            max_len = json_msg_decode["max_length"]
+            # length bounds (a value <= 0 disables the check)
+            len_lo = max(min_len, 0)
+            len_hi = max_len if max_len > 0 else float("inf")
+
             print("\nStart decoding messages ...\n")
 
-            print(f"{TerminalColors.CYAN}   COB:{json_msg_decode['cob']}")
-            print(f"   min length:{str(json_msg_decode['min_length'])}")
-            print(f"   max length:{str(json_msg_decode['max_length'])}{TerminalColors.END}\n")
-
-            # Analyze line by line
-            with open(arguments_list.datafilepath, 'r') as file:
-                for line in file:
-                    # Extract info using regex
-                    decoded_values = re.search(re_parsing_can_msg, line)
-                    if decoded_values:
-
-                        msg = CanMessage(str(decoded_values.group(1)), 
-                                         str(decoded_values.group(2)),
-                                         int(decoded_values.group(3)),
-                                         int(decoded_values.group(4)),
-                                         str(decoded_values.group(5)),
-                                         json_msg_decode["decode"])
-
-                        # Check validity
-                        if (msg.cob_id_hex != json_msg_decode["cob"]):
-                            continue
-                        if (json_msg_decode["min_length"] > 0 ) and (msg.len < json_msg_decode["min_length"]):
-                            continue
-                        if (json_msg_decode["max_length"] > 0 ) and (msg.len > json_msg_decode["max_length"]):
-                            continue
-
-                        msg.Decode()
-                        print(f"{TerminalColors.GREEN}{msg.Info()}{TerminalColors.END}")
-                        packet_list.append(msg)
+            print(f"{TerminalColors.CYAN}   COB:{cob_target.decode()}")
+            print(f"   min length:{str(min_len)}")
+            print(f"   max length:{str(max_len)}{TerminalColors.END}\n")
 
             print("Writing decoded packets into .dp file")
-            write_decoded_packets()
+
+            # Analyze all lines
+            with open(arguments_list.datafilepath, 'rb') as file, \
+                 open(arguments_list.datafilepath + ".dp", "w", buffering=1<<20) as output_file:
+                # Extract info using regex
+                for decoded_values in scan_file(file, RE_CAN_MSG):
+                    # Check validity (before building the message)
+                    cob = decoded_values.group(2)
+                    if (cob != cob_target):
+                        continue
+                    length = int(decoded_values.group(4))
+                    if not (len_lo <= length <= len_hi):
+                        continue
+
+                    msg = CanMessage(decoded_values.group(1).decode(), 
+                                     cob.decode('ascii'),
+                                     int(decoded_values.group(3)),
+                                     length,
+                                     decoded_values.group(5).decode('ascii'),
+                                     decode_prog)
+
+                    msg.Decode()
+                    msg_info = msg.Info()
+                    print(f"{TerminalColors.GREEN}{msg_info}{TerminalColors.END}")
+                    write_decoded_packet(msg_info)
+
             print("End\n")
         else:
             print("ERR: JSON File not found!")    
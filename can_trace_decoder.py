@@ -61,99 +61,100 @@ import os.path
 import argparse
 import re
 import math
-from collections import deque
-
-re_basic_hex = "[0-9aAbBcCdDeEfF]"
-re_basic_hex_with_spaces = "[0-9aAbBcCdDeEfF ]"
-re_parsing_can_trace = r'^"(.*)","(' + re_basic_hex + '{3})","(.*)","(.*)","(' + re_basic_hex_with_spaces + '{23})"$'
-re_parsing_data_hex = r'^"(' + re_basic_hex + '{2}) \
-                          (' + re_basic_hex + '{2}) \
-                          (' + re_basic_hex + '{2}) \
-                          (' + re_basic_hex + '{2}) \
-                          (' + re_basic_hex + '{2}) \
-                          (' + re_basic_hex + '{2}) \
-                          (' + re_basic_hex + '{2}) \
-                          (' + re_basic_hex + '{2})"$'
-
-# Store decoded packets
-packet_list = deque()
+import mmap
+
+re_basic_hex = rb"[0-9aAbBcCdDeEfF]"
+re_data_bytes = re_basic_hex + rb'{2}(?: ' + re_basic_hex + rb'{2}){7}'
+RE_CAN_TRACE = re.compile(rb'^"(.*)","(' + re_basic_hex + rb'{3})","(.*)","(.*)","(' + re_data_bytes + rb')"\r?$', re.ASCII | re.MULTILINE)
+
+# Show detailed logging (set from command line)
+VERBOSE = False
 
 # store in-progress packets (when multiple segments)
-# (key is the COB)
-packet_in_progress_list = dict()
+# (index is the COB value, 3 hex digits)
+packet_in_progress = [None] * 0x1000
 
 class CanPacket:
 
+    __slots__ = ('rx_time', 'rx_cob', 'rx_chunks', 'rx_len', 'rx_msg_number')
+
     def Append(self, data: str):
-        self.rx_data += data
-        self.rx_len = len(self.rx_data) / 2
+        self.rx_chunks.append(data)
+        self.rx_len += len(data) // 2
 
     def Info(self):
         info = "{0:<14} ; {1:<4} ; {2:<6} ; {3:<6d} ; {4:<}"
-        return info.format(self.rx_time, self.rx_cob, self.rx_msg_number, int(self.rx_len), self.rx_data)
+        return info.format(self.rx_time, self.rx_cob, self.rx_msg_number, self.rx_len, "".join(self.rx_chunks))
     
     def __init__(self, time: str, cob: str, data: str, msg_number: int):
         self.rx_time = time
         self.rx_cob = cob
-        self.rx_data = data
-        self.rx_len = len(data) / 2
+        self.rx_chunks = [data]     # hex strings, joined only by Info()
+        self.rx_len = len(data) // 2
         self.rx_msg_number = msg_number
 
-def first_segment(time: str, cob: str, data: str):
+def first_segment(time: str, cob: str, cob_i: int, data: str, vb: int):
     MSG_NUM_field = int(data[2:4], 16)
     MSG_LEN_field = int(data[4:8], 16)
     # TODO check message sequence
-    if cob in packet_in_progress_list:
+    if packet_in_progress[cob_i] is not None:
         print("ERR: previous msg was incomplete, discarded and start with a new one")
     else:
-        packet_in_progress_list[cob] = CanPacket(time, cob, data[8:], MSG_NUM_field)
+        packet_in_progress[cob_i] = CanPacket(time, cob, data[8:], MSG_NUM_field)
 
-def middle_segment(time: str, cob: str, data: str):
-    if cob in packet_in_progress_list:
-        packet_in_progress_list[cob].Append(data[2:])
+def middle_segment(time: str, cob: str, cob_i: int, data: str, vb: int):
+    packet = packet_in_progress[cob_i]
+    if packet is not None:
+        packet.Append(data[2:])
     else:
         print("ERR: first segment is missing, middle segment discarded")
 
-def end_segment(time: str, cob: str, data: str, VB: str):
-    if cob in packet_in_progress_list:
-        packet_in_progress_list[cob].Append(data[2:2+2*int(VB, 2)])
-        if arguments_list.verbose:
-            print(packet_in_progress_list[cob].Info())
-        packet_list.append(packet_in_progress_list.pop(cob))
+def end_segment(time: str, cob: str, cob_i: int, data: str, vb: int):
+    packet = packet_in_progress[cob_i]
+    if packet is not None:
+        packet.Append(data[2:2+2*vb])
+        packet_in_progress[cob_i] = None
+        write_decoded_packet(packet)
     else:
         print("ERR: first and middle segments are missing, end segment discarded")
 
-def single_segment(time: str, cob: str, data: str, VB: str):
+def single_segment(time: str, cob: str, cob_i: int, data: str, vb: int):
     MSG_NUM_field = int(data[2:4], 16)
     # TODO check message sequence
-    message = CanPacket(time, cob, data[4:4+2*int(VB, 2)], int(MSG_NUM_field))
-    if arguments_list.verbose:
-        print(message.Info())
-    packet_list.append(message)
+    message = CanPacket(time, cob, data[4:4+2*vb], int(MSG_NUM_field))
+    write_decoded_packet(message)
+
+# Segment handlers indexed by CS value (VB is ignored by first/middle,
+# cob_i, the COB as int, by single)
+SEGMENT_HANDLERS = (first_segment, middle_segment, end_segment, single_segment)
 
 def manage_can_segment(time: str, cob: str, data: str):
-    data = data.replace(" ","")
-    byte0 = "{0:08b}".format(int(data[0:2], 16))    
-    CS_field = byte0[:3]
-    SN_field = byte0[3:5:1]
-    VB_field = byte0[-3:]
+    # data is the 8 bytes payload as 16 hex chars (no spaces)
+    b0 = int(data[0:2], 16)
+    cs = b0 >> 5        # bits 7..5
+    vb = b0 & 0x7       # bits 2..0
     
-    if CS_field == "000" :
-        first_segment(time, cob, data)        
-    elif CS_field == "001" :
-        middle_segment(time, cob, data)        
-    elif CS_field == "010" :
-        end_segment(time, cob, data, VB_field)        
-    elif CS_field == "011" :
-        single_segment(time, cob, data, VB_field)
+    if cs < 4 :
+        SEGMENT_HANDLERS[cs](time, cob, int(cob, 16), data, vb)
     else :
-        print("ERR: invalid CS for value " + CS_field)
-
-def write_decoded_packets():
-    output_file = open(arguments_list.tracefilepath + ".dt", "w")
-    for elem in packet_list:
-        output_file.write(elem.Info() + "\n")
-    output_file.close()   
+        print("ERR: invalid CS for value " + "{0:03b}".format(cs))
+
+def write_decoded_packet(packet: CanPacket):
+    info = packet.Info()
+    if VERBOSE:
+        print(info)
+    output_file.write(info)
+    output_file.write("\n")
+
+def scan_file(file, pattern):
+    # Memory-map the file and let the regex engine scan all lines in one pass
+    # (pattern is anchored per line with MULTILINE)
+    if os.fstat(file.fileno()).st_size == 0:
+        return
+    with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mmap, "MADV_SEQUENTIAL"):
+            mm.madvise(mmap.MADV_SEQUENTIAL)
+        yield from pattern.finditer(mm)
 
 def create_arg_parser():
     # Creates and returns the ArgumentParser object
@@ -172,31 +173,29 @@ def create_arg_parser():
 if __name__ == "__main__":
     arguments = create_arg_parser()
     arguments_list = arguments.parse_args()
+    VERBOSE = arguments_list.verbose
     
     # Check file existence
     if os.path.isfile(arguments_list.tracefilepath):
         print("Opening file: " + arguments_list.tracefilepath)
         print("Start analyze trace...")
 
-        # Analyze line by line
-        with open(arguments_list.tracefilepath, 'r') as file:
-            for line in file:
-                # Extract info using regex - FIXME make it compatible to all formats
-                decoded_values = re.search(re_parsing_can_trace, line)
-                if decoded_values:
-
-                    time_info = str(decoded_values.group(1))
-                    cob_hex_info = str(decoded_values.group(2))
-                    data_hex_info = str(decoded_values.group(5))
+        print("Writing decoded packets into .dt file")
 
-                    # Debug
-                    if arguments_list.verbose:
-                        print(time_info + " " + cob_hex_info + " " + data_hex_info)
+        # Analyze all lines
+        with open(arguments_list.tracefilepath, 'rb') as file, \
+             open(arguments_list.tracefilepath + ".dt", "w", buffering=1<<20) as output_file:
+            # Extract info using regex - FIXME make it compatible to all formats
+            for decoded_values in scan_file(file, RE_CAN_TRACE):
+                time_info = decoded_values.group(1).decode()
+                cob_hex_info = decoded_values.group(2).decode('ascii')
+                data_hex_info = decoded_values.group(5)
 
-                    manage_can_segment(time_info, cob_hex_info, data_hex_info)
+                # Debug
+                if VERBOSE:
+                    print(time_info + " " + cob_hex_info + " " + data_hex_info.decode('ascii'))
 
-            print("Writing decoded packets into .dt file")
-            write_decoded_packets()
+                manage_can_segment(time_info, cob_hex_info, data_hex_info.replace(b" ", b"").decode('ascii'))
 
         print("End\n")
     else: